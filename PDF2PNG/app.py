@@ -1,172 +1,540 @@
-import streamlit as st
-import pypdfium2
-from dotenv import load_dotenv
-import os
-import io
-import zipfile
-import PyPDF2
-
-# --- Configuration and Page Setup ---
-st.set_page_config(
-    page_title="PDF to PNG Converter",
-    page_icon="📄",
-    layout="wide"
-)
-
-# --- Caching ---
-@st.cache_data(max_entries=5)
-def perform_conversion(pdf_bytes, dpi):
-    """
-    Converts PDF bytes into a list of image bytes and a zip file using pypdfium2.
-    Fully compatible with Streamlit Cloud (no Poppler required).
-    """
-    try:
-        pdf = pypdfium2.PdfDocument(io.BytesIO(pdf_bytes))
-        image_bytes_list = []
-        zip_buffer = io.BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-            for i in range(len(pdf)):
-                page = pdf[i]
-                # Render each page to a PIL image (scale factor adjusts DPI)
-                pil_image = page.render(scale=dpi / 72).to_pil()
-
-                img_buffer = io.BytesIO()
-                pil_image.save(img_buffer, format="PNG")
-                img_bytes = img_buffer.getvalue()
-
-                image_bytes_list.append(img_bytes)
-                zf.writestr(f"page_{i + 1:03d}.png", img_bytes)
-
-        return image_bytes_list, zip_buffer.getvalue()
-
-    except Exception as e:
-        return None, str(e)
-
-# --- NEW: Image Dialog Function ---
-@st.dialog("Enlarged Image")
-def show_image_dialog(image_bytes, page_num):
-    """Displays the selected image in a large dialog box."""
-    st.image(image_bytes, caption=f"Page {page_num}", width='stretch') 
-    if st.button("Close"):
-        st.rerun()
-
-# --- Sidebar ---
-with st.sidebar:
-    st.header("Upload & Settings")
-    uploaded_file = st.file_uploader("Select a PDF file", type=["pdf"])
-    
-    load_dotenv() 
-    dpi_options = [150, 300, 600]
-    try:
-        default_dpi = int(os.getenv("OUTPUT_DPI", 300))
-        default_index = dpi_options.index(default_dpi)
-    except ValueError:
-        default_index = 1 
-    
-    dpi = st.selectbox(
-        "Select Image Resolution (DPI)",
-        options=dpi_options,
-        index=default_index,
-        help="Higher DPI means higher quality and longer conversion time."
-    )
-    
-    st.markdown("---")
-    st.write("This app converts your PDF into high-quality PNG images.")
-
-# --- Main Page ---
-st.title("📄 PDF to High-Quality PNG Converter")
-
-# --- Function to check page count ---
-def get_pdf_page_count(pdf_bytes):
-    try:
-        reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-        return len(reader.pages)
-    except Exception:
-        return 101  # fallback if unable to count
-
-if uploaded_file is not None:
-    pdf_bytes = uploaded_file.getvalue()
-    pdf_filename = os.path.splitext(uploaded_file.name)[0]
-    
-    # Check page count
-    page_count = get_pdf_page_count(pdf_bytes)
-    MAX_SAFE_PAGES = 50 
-    MAX_SAFE_DPI = 150
-
-    # Safety limit to prevent memory issues
-    if page_count > MAX_SAFE_PAGES and dpi > MAX_SAFE_DPI:
-        st.warning(
-            f"⚠️ **Memory Safety Triggered:** Your PDF has {page_count} pages. "
-            f"Due to server memory limits, the DPI has been reduced from {dpi} to **{MAX_SAFE_DPI}** to prevent the app from crashing."
-        )
-        dpi_safe = MAX_SAFE_DPI
-    else:
-        dpi_safe = dpi
-
-    file_id = uploaded_file.file_id
-
-    if ("last_file_id" not in st.session_state or 
-        st.session_state.last_file_id != file_id or 
-        st.session_state.last_dpi != dpi_safe):
-        
-        with st.spinner(f"Converting '{uploaded_file.name}' at {dpi_safe} DPI..."):
-            image_bytes_list, zip_data = perform_conversion(pdf_bytes, dpi_safe)
-            
-            st.session_state.image_bytes_list = image_bytes_list
-            st.session_state.zip_data = zip_data
-            st.session_state.last_file_id = file_id
-            st.session_state.last_dpi = dpi_safe
-            st.session_state.pdf_filename = pdf_filename
-            
-            if isinstance(image_bytes_list, list):
-                st.success(f"✅ Conversion successful! Found {len(image_bytes_list)} pages.")
-            else:
-                st.error(f"❌ A conversion error occurred: {zip_data}")
-                st.session_state.clear()
-
-    # --- Display Results ---
-    if "image_bytes_list" in st.session_state and isinstance(st.session_state.image_bytes_list, list):
-        image_bytes_list = st.session_state.image_bytes_list
-        zip_data = st.session_state.zip_data
-        pdf_filename = st.session_state.pdf_filename
-
-        st.download_button(
-            label=f"Download All Pages as .ZIP",
-            data=zip_data,
-            file_name=f"{pdf_filename}_all_pages.zip",
-            mime="application/zip",
-            width='stretch',
-            on_click="ignore"
-        )
-        
-        st.divider()
-        st.subheader("Individual Page Downloads")
-        
-        cols = st.columns(3)
-        for i, img_bytes in enumerate(image_bytes_list):
-            page_name = f"{pdf_filename}_page_{i + 1:03d}.png"
-            
-            with cols[i % 3]:
-                st.image(img_bytes, caption=f"Page {i + 1}", width='stretch')
-                btn_col1, btn_col2 = st.columns(2)
-
-                with btn_col1:
-                    if st.button("Enlarge 🔎", key=f"enlarge_{i}", use_container_width=True):
-                        show_image_dialog(img_bytes, i + 1)
-
-                with btn_col2:
-                    st.download_button(
-                        label="Download ⬇️",
-                        data=img_bytes,
-                        file_name=page_name,
-                        mime="image/png",
-                        use_container_width=True,
-                        key=f"download_{i}",
-                        on_click="ignore"
-                    )
-                st.markdown("---")
-else:
-    if "last_file_id" in st.session_state:
-        st.session_state.clear()
-    st.info("Please upload a PDF file using the sidebar on the left to begin.")
+import streamlit as st
+import numpy
+import pypdfium2
+from PIL import Image
+from dotenv import load_dotenv
+import concurrent.futures
+import hashlib
+import os
+import io
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+
+# --- Configuration and Page Setup ---
+st.set_page_config(
+    page_title="PDF to PNG Converter",
+    page_icon="📄",
+    layout="wide"
+)
+
+# --- Conversion Workers ---
+# Output formats: UI label -> (PIL format, file extension, MIME type)
+OUTPUT_FORMATS = {
+    "PNG (lossless)": ("PNG", "png", "image/png"),
+    "JPEG (small)": ("JPEG", "jpg", "image/jpeg"),
+    "WebP (smallest)": ("WEBP", "webp", "image/webp"),
+}
+MIME_TYPES = {ext: mime for _, ext, mime in OUTPUT_FORMATS.values()}
+MIME_TYPES["jpeg"] = "image/jpeg"
+EXT_BY_FMT = {fmt: ext for fmt, ext, _ in OUTPUT_FORMATS.values()}
+
+def _encode_bitmap(bitmap, fmt="PNG"):
+    """Encodes a pdfium bitmap to image bytes straight from the raw buffer."""
+    # Build the PIL image from pdfium's raw buffer. rev_byteorder during
+    # render delivers RGB order directly, avoiding the BGR->RGB swap pass
+    # that to_pil() needs. frombuffer itself is only zero-copy for L/RGBA
+    # modes; 3-channel RGB (the common opaque-page case) still makes one
+    # copy inside Pillow.
+    pil_image = Image.frombuffer(
+        bitmap.mode, (bitmap.width, bitmap.height),
+        bitmap.buffer, "raw", bitmap.mode, bitmap.stride, 1
+    )
+
+    img_buffer = io.BytesIO()
+    if fmt == "JPEG":
+        # JPEG handles RGB and grayscale natively; anything else converts.
+        if pil_image.mode not in ("RGB", "L"):
+            pil_image = pil_image.convert("RGB")
+        pil_image.save(img_buffer, format="JPEG", quality=90)
+    elif fmt == "WEBP":
+        if pil_image.mode not in ("RGB", "RGBA"):
+            pil_image = pil_image.convert("RGB")
+        pil_image.save(img_buffer, format="WEBP", quality=80, method=4)
+    else:
+        # zlib level 1 encodes several times faster than Pillow's default
+        # level 6 for only a marginally larger file.
+        pil_image.save(img_buffer, format="PNG", compress_level=1)
+    return img_buffer.getvalue()
+
+def _precompress_entry(img_bytes):
+    """
+    Deflates a ZIP entry payload in the worker (raw deflate, as ZIP stores
+    it), so the opt-in recompression scales across cores instead of
+    serializing in the parent. Returns (crc, file_size, compressed_bytes).
+    """
+    comp = zlib.compressobj(1, zlib.DEFLATED, -15)
+    comp_bytes = comp.compress(img_bytes) + comp.flush()
+    return zlib.crc32(img_bytes), len(img_bytes), comp_bytes
+
+def _write_precompressed(zf, name, crc, file_size, comp_bytes):
+    """
+    Appends an already-deflated payload as a ZIP entry, bypassing the
+    single-threaded compressor a ZipFile.writestr would run. Performs the
+    same bookkeeping writestr does, just with our precomputed sizes/CRC.
+    """
+    zinfo = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.external_attr = 0o600 << 16  # rw------- like writestr, not mode 000
+    zinfo.file_size = file_size
+    zinfo.compress_size = len(comp_bytes)
+    zinfo.CRC = crc
+    zinfo.header_offset = zf.fp.tell()
+
+    zf._writecheck(zinfo)
+    zf._didModify = True
+    # No zip64 header: a single page image never approaches the 4 GB
+    # entry limit (the stored path passes force_zip64 only out of caution).
+    zf.fp.write(zinfo.FileHeader(False))
+    zf.fp.write(comp_bytes)
+    zf.start_dir = zf.fp.tell()
+    zf.filelist.append(zinfo)
+    zf.NameToInfo[zinfo.filename] = zinfo
+
+def _extract_page_jpeg(page):
+    """
+    Returns the embedded JPEG bytes if the page consists of exactly one
+    full-bleed DCTDecode image (typical of scanned or comic PDFs), else
+    None. Copying the source JPEG skips rasterizing and re-encoding an
+    image the PDF already stores in a good format.
+    """
+    try:
+        images = list(page.get_objects(
+            filter=(pypdfium2.raw.FPDF_PAGEOBJ_IMAGE,), max_depth=1
+        ))
+        if len(images) != 1:
+            return None
+        image = images[0]
+        if image.get_filters(skip_simple=True) != ["DCTDecode"]:
+            return None
+
+        # The copied stream bypasses page rotation and the placement
+        # matrix, so only take the shortcut for an unrotated page with a
+        # plain axis-aligned positive scale — anything rotated, mirrored
+        # or skewed must go through a real render to come out right.
+        if page.get_rotation() != 0:
+            return None
+        matrix = image.get_matrix()
+        if matrix.b != 0 or matrix.c != 0 or matrix.a <= 0 or matrix.d <= 0:
+            return None
+
+        # Only take the shortcut when the image covers the whole page
+        # (within a point of slack); anything else needs a real render.
+        left, bottom, right, top = image.get_bounds()
+        width, height = page.get_size()
+        if left > 1 or bottom > 1 or right < width - 1 or top < height - 1:
+            return None
+
+        # A raw CMYK JPEG would not display as rendered (no conversion,
+        # Adobe inversion quirks), and unusual colorspaces can hide masks
+        # or indirection pdfium resolves only while rendering. Stick to
+        # plain 8-bit gray / 24-bit RGB.
+        meta = image.get_metadata()
+        if meta.colorspace not in (
+            pypdfium2.raw.FPDF_COLORSPACE_DEVICEGRAY,
+            pypdfium2.raw.FPDF_COLORSPACE_DEVICERGB,
+            pypdfium2.raw.FPDF_COLORSPACE_CALGRAY,
+            pypdfium2.raw.FPDF_COLORSPACE_CALRGB,
+        ) or meta.bits_per_pixel not in (8, 24):
+            return None
+
+        # decode_simple applies simple filters (e.g. an outer FlateDecode),
+        # leaving the raw JPEG stream.
+        return bytes(image.get_data(decode_simple=True))
+    except Exception:
+        return None
+
+def _render_page_range(pdf_bytes, start, end, dpi, grayscale=False, fmt="PNG", precompress=False):
+    """
+    Renders pages [start, end) inside a worker process, producing a
+    (thumb_bytes, full_bytes, ext) triple per page: a 72-DPI thumbnail
+    for the page grid and the full-DPI image for the ZIP. Single-image
+    JPEG pages are extracted as-is (ext 'jpg') instead of re-rendered.
+    With precompress=True the full image is instead returned as a
+    _precompress_entry tuple, ready to splice into the archive. The PDF
+    is reopened from bytes in each worker because pdfium handles cannot
+    be shared safely across processes.
+    """
+    pdf = pypdfium2.PdfDocument(io.BytesIO(pdf_bytes))
+    pages = []
+    scale = dpi / 72.0  # hoisted: identical for every page in the shard
+    # Content-addressed cache so repeated pages (blank spacers, chapter
+    # dividers) are encoded once. Hashing the raw buffer is orders of
+    # magnitude cheaper than re-encoding a page.
+    encoded_cache = {}
+
+    def encode_cached(bitmap):
+        key = hashlib.blake2b(bitmap.buffer, digest_size=16).digest()
+        encoded = encoded_cache.get(key)
+        if encoded is None:
+            encoded = encoded_cache[key] = _encode_bitmap(bitmap, fmt)
+        return encoded
+
+    def render_page(i):
+        page = pdf[i]
+        # A page that is just one embedded JPEG (scans, comics) is copied
+        # out directly — unless grayscale conversion was requested, which
+        # needs a real render. Scale factor adjusts DPI; grayscale renders
+        # at 1 byte/pixel, quartering the data the encoder sees.
+        jpeg_bytes = None if grayscale else _extract_page_jpeg(page)
+        full_bitmap = None
+        if jpeg_bytes is None:
+            full_bitmap = page.render(scale=scale, rev_byteorder=True, grayscale=grayscale)
+        thumb_bitmap = page.render(scale=1.0, rev_byteorder=True, grayscale=grayscale)
+        return page, jpeg_bytes, full_bitmap, thumb_bitmap
+
+    def release_page(page, full_bitmap, thumb_bitmap):
+        if full_bitmap is not None:
+            full_bitmap.close()
+        thumb_bitmap.close()
+        page.close()
+
+    # Pipeline render and encode: pdfium (render) and Pillow (encode) both
+    # release the GIL, so page i+1 rasterizes on the helper thread while
+    # page i encodes here. Only one render is in flight at a time, keeping
+    # all pdfium calls serialized and in-flight bitmaps capped at two pages.
+    ext = EXT_BY_FMT.get(fmt, "png")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as render_pool:
+        next_render = render_pool.submit(render_page, start)
+        for i in range(start, end):
+            page, jpeg_bytes, full_bitmap, thumb_bitmap = next_render.result()
+            if i + 1 < end:
+                next_render = render_pool.submit(render_page, i + 1)
+
+            if jpeg_bytes is not None:
+                full_bytes, page_ext = jpeg_bytes, "jpg"
+            else:
+                full_bytes, page_ext = encode_cached(full_bitmap), ext
+            thumb_bytes = encode_cached(thumb_bitmap)
+            if precompress:
+                full_bytes = _precompress_entry(full_bytes)
+            pages.append((thumb_bytes, full_bytes, page_ext))
+
+            # Free pdfium's C buffers as soon as the page is encoded instead
+            # of leaving them to GC, so worker RSS stays bounded at ~two
+            # pages of raw bitmap no matter how long the PDF is. The close
+            # calls run on the helper thread to keep pdfium single-threaded.
+            render_pool.submit(release_page, page, full_bitmap, thumb_bitmap)
+
+    pdf.close()
+    return pages
+
+def _max_channel_divergence(rgb):
+    """Largest |R-G| / |G-B| over all pixels of an HxWx3 uint8 array."""
+    # Vectorized numpy is plenty here: the input is a 72-DPI thumbnail,
+    # so the whole scan takes microseconds.
+    rgb = rgb.astype(numpy.int16)
+    return int(max(
+        numpy.abs(rgb[..., 0] - rgb[..., 1]).max(),
+        numpy.abs(rgb[..., 1] - rgb[..., 2]).max(),
+    ))
+
+def _bitmap_as_array(bitmap):
+    """Zero-copy numpy view (height x width x channels) of a pdfium bitmap."""
+    rows = numpy.frombuffer(bitmap.buffer, dtype=numpy.uint8)
+    rows = rows.reshape(bitmap.height, bitmap.stride)
+    # Drop pdfium's row padding, then split rows into pixels.
+    n = bitmap.n_channels
+    return rows[:, :bitmap.width * n].reshape(bitmap.height, bitmap.width, n)
+
+@st.cache_data(max_entries=5)
+def detect_grayscale(pdf_hash):
+    """
+    Heuristic: render a 72-DPI thumbnail of the first page and report True
+    if its RGB channels never diverge by more than a rounding error.
+    """
+    try:
+        pdf_bytes = st.session_state.pdf_store[pdf_hash]
+        pdf = pypdfium2.PdfDocument(io.BytesIO(pdf_bytes))
+        bitmap = pdf[0].render(scale=1.0, rev_byteorder=True)
+        max_diff = _max_channel_divergence(_bitmap_as_array(bitmap))
+        bitmap.close()
+        pdf.close()
+        return max_diff <= 8
+    except Exception:
+        return False
+
+# --- Caching ---
+# cache_resource rather than cache_data: the returned zip handle is a live
+# file object, not a picklable value.
+@st.cache_resource(max_entries=5)
+def perform_conversion(pdf_hash, dpi, recompress_zip=False, grayscale=False, fmt="PNG"):
+    """
+    Converts the stashed PDF identified by pdf_hash into a zip of images
+    using pypdfium2, returning the entry names, the 72-DPI thumbnails for
+    the page grid, the open zip file handle, and the lock that must guard
+    every seek/read on it (cache_resource shares the handle — and its one
+    file position — across sessions and reruns). Caching on the 16-byte
+    hash instead of the raw payload keeps cache lookups O(1) rather than
+    re-hashing a multi-MB argument on every rerun. Pages are rendered in
+    parallel worker processes (rendering is compute-bound and pdfium
+    serializes within a single process, so threads would not help). Fully
+    compatible with Streamlit Cloud (no Poppler required).
+    """
+    try:
+        pdf_bytes = st.session_state.pdf_store[pdf_hash]
+        pdf = pypdfium2.PdfDocument(io.BytesIO(pdf_bytes))
+        num_pages = len(pdf)
+        pdf.close()
+
+        # Split the page range into one shard per CPU core. pypdfium2's
+        # built-in multi-process renderer (PdfDocument.render with
+        # n_processes) was removed in v5, so sharding ourselves is the
+        # supported way to render pages on multiple cores.
+        workers = min(os.cpu_count() or 1, num_pages)
+        chunk = -(-num_pages // workers)  # ceiling division
+        ranges = [(s, min(s + chunk, num_pages)) for s in range(0, num_pages, chunk)]
+
+        def iter_shards():
+            if len(ranges) == 1:
+                # Not worth spawning a process pool for a single shard.
+                yield _render_page_range(pdf_bytes, 0, num_pages, dpi, grayscale, fmt, recompress_zip)
+            else:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = [
+                        pool.submit(_render_page_range, pdf_bytes, start, end, dpi, grayscale, fmt, recompress_zip)
+                        for start, end in ranges
+                    ]
+                    # Yield in submission order so pages stay sequential.
+                    for future in futures:
+                        yield future.result()
+
+        # PNGs are already deflate-compressed, so re-deflating them in the
+        # ZIP burns CPU for ~0% size gain. Store them uncompressed unless
+        # the user explicitly asks otherwise (then use the fastest level).
+        # The archive spills to disk past 64 MB instead of growing an
+        # in-memory BytesIO to the full output size.
+        zip_buffer = tempfile.SpooledTemporaryFile(max_size=64 << 20)
+        if recompress_zip:
+            zip_args = {"compression": zipfile.ZIP_DEFLATED, "compresslevel": 1}
+        else:
+            zip_args = {"compression": zipfile.ZIP_STORED}
+
+        # Stream each shard straight into the archive and drop its bytes
+        # immediately, instead of keeping every PNG alive in a list next
+        # to the growing ZIP (2x the total output size in RAM). Only the
+        # small thumbnails stay in memory for the grid; full-resolution
+        # pages are read back from the archive on demand.
+        page_names = []
+        thumbs = []
+        with zipfile.ZipFile(zip_buffer, "w", **zip_args) as zf:
+            for shard in iter_shards():
+                for thumb_bytes, img_bytes, ext in shard:
+                    name = f"page_{len(page_names) + 1:03d}.{ext}"
+                    if recompress_zip:
+                        # Workers already deflated the payload in parallel.
+                        _write_precompressed(zf, name, *img_bytes)
+                    else:
+                        with zf.open(zipfile.ZipInfo(name), "w", force_zip64=True) as entry:
+                            entry.write(img_bytes)
+                    page_names.append(name)
+                    thumbs.append(thumb_bytes)
+
+        return page_names, thumbs, zip_buffer, threading.Lock()
+
+    except Exception as e:
+        return None, None, str(e), None
+
+# --- NEW: Image Dialog Function ---
+@st.dialog("Enlarged Image")
+def show_image_dialog(image_bytes, page_num):
+    """Displays the selected image in a large dialog box."""
+    st.image(image_bytes, caption=f"Page {page_num}", width='stretch') 
+    if st.button("Close"):
+        st.rerun()
+
+# --- Sidebar ---
+with st.sidebar:
+    st.header("Upload & Settings")
+    uploaded_file = st.file_uploader("Select a PDF file", type=["pdf"])
+    
+    load_dotenv() 
+    dpi_options = [150, 300, 600]
+    try:
+        default_dpi = int(os.getenv("OUTPUT_DPI", 300))
+        default_index = dpi_options.index(default_dpi)
+    except ValueError:
+        default_index = 1 
+    
+    dpi = st.selectbox(
+        "Select Image Resolution (DPI)",
+        options=dpi_options,
+        index=default_index,
+        help="Higher DPI means higher quality and longer conversion time."
+    )
+
+    output_format = st.selectbox(
+        "Output format",
+        options=list(OUTPUT_FORMATS),
+        index=0,
+        help="PNG is pixel-perfect; JPEG and WebP are far smaller for scanned or photo-heavy pages."
+    )
+
+    recompress_zip = st.checkbox(
+        "Recompress ZIP",
+        value=False,
+        help="PNG files are already compressed, so this rarely shrinks the ZIP and slows down conversion."
+    )
+
+    color_mode = st.selectbox(
+        "Color mode",
+        options=["Auto-detect", "Color", "Grayscale"],
+        index=0,
+        help="Grayscale renders at 1 byte per pixel for faster conversion and ~4x smaller files. "
+             "Auto-detect checks the first page; pick Color or Grayscale to override it."
+    )
+
+    st.markdown("---")
+    st.write("This app converts your PDF into high-quality PNG images.")
+
+# --- Main Page ---
+st.title("📄 PDF to High-Quality PNG Converter")
+
+# --- Function to check page count ---
+@st.cache_data(max_entries=5)
+def get_pdf_page_count(pdf_hash):
+    try:
+        pdf_bytes = st.session_state.pdf_store[pdf_hash]
+        pdf = pypdfium2.PdfDocument(io.BytesIO(pdf_bytes))
+        page_count = len(pdf)
+        pdf.close()
+        return page_count
+    except Exception:
+        return 101  # fallback if unable to count
+
+if uploaded_file is not None:
+    pdf_filename = os.path.splitext(uploaded_file.name)[0]
+
+    # Hash the upload once and stash its bytes; the cached functions take
+    # the 32-char digest, so st.cache_* hashes a short string per rerun
+    # instead of re-hashing the full multi-MB payload on every lookup.
+    if st.session_state.get("pdf_file_id") != uploaded_file.file_id:
+        pdf_bytes = uploaded_file.getvalue()
+        pdf_hash = hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+        st.session_state.pdf_file_id = uploaded_file.file_id
+        st.session_state.pdf_hash = pdf_hash
+        st.session_state.pdf_store = {pdf_hash: pdf_bytes}
+    pdf_hash = st.session_state.pdf_hash
+
+    # Check page count
+    page_count = get_pdf_page_count(pdf_hash)
+    MAX_SAFE_PAGES = 50 
+    MAX_SAFE_DPI = 150
+
+    # Safety limit to prevent memory issues
+    if page_count > MAX_SAFE_PAGES and dpi > MAX_SAFE_DPI:
+        st.warning(
+            f"⚠️ **Memory Safety Triggered:** Your PDF has {page_count} pages. "
+            f"Due to server memory limits, the DPI has been reduced from {dpi} to **{MAX_SAFE_DPI}** to prevent the app from crashing."
+        )
+        dpi_safe = MAX_SAFE_DPI
+    else:
+        dpi_safe = dpi
+
+    if color_mode == "Auto-detect":
+        grayscale = detect_grayscale(pdf_hash)
+        if grayscale:
+            st.info(
+                "🎨 The first page contains no color, so pages are rendered in grayscale. "
+                "Set Color mode to \"Color\" to keep color output."
+            )
+    else:
+        grayscale = color_mode == "Grayscale"
+
+    fmt = OUTPUT_FORMATS[output_format][0]
+    file_id = uploaded_file.file_id
+
+    if ("last_file_id" not in st.session_state or
+        st.session_state.last_file_id != file_id or
+        st.session_state.last_dpi != dpi_safe or
+        st.session_state.last_recompress != recompress_zip or
+        st.session_state.last_grayscale != grayscale or
+        st.session_state.last_fmt != fmt):
+
+        with st.spinner(f"Converting '{uploaded_file.name}' at {dpi_safe} DPI..."):
+            page_names, thumbs, zip_file, zip_lock = perform_conversion(pdf_hash, dpi_safe, recompress_zip, grayscale, fmt)
+
+            st.session_state.page_names = page_names
+            st.session_state.thumbs = thumbs
+            st.session_state.zip_file = zip_file
+            st.session_state.zip_lock = zip_lock
+            st.session_state.last_file_id = file_id
+            st.session_state.last_dpi = dpi_safe
+            st.session_state.last_recompress = recompress_zip
+            st.session_state.last_grayscale = grayscale
+            st.session_state.last_fmt = fmt
+            st.session_state.pdf_filename = pdf_filename
+
+            if isinstance(page_names, list):
+                st.success(f"✅ Conversion successful! Found {len(page_names)} pages.")
+            else:
+                st.error(f"❌ A conversion error occurred: {zip_file}")
+                st.session_state.clear()
+
+    # --- Display Results ---
+    if "page_names" in st.session_state and isinstance(st.session_state.page_names, list):
+        page_names = st.session_state.page_names
+        thumbs = st.session_state.thumbs
+        zip_file = st.session_state.zip_file
+        zip_lock = st.session_state.zip_lock
+        pdf_filename = st.session_state.pdf_filename
+
+        # The cached handle (and its single file position) is shared by
+        # every session and rerun, so all seeks and reads go through its
+        # lock; concurrent script runs would otherwise interleave on it.
+        # Streamlit consumes the download payload while the widget is
+        # created, i.e. inside the guarded block.
+        with zip_lock:
+            zip_file.seek(0)
+            st.download_button(
+                label=f"Download All Pages as .ZIP",
+                data=zip_file,
+                file_name=f"{pdf_filename}_all_pages.zip",
+                mime="application/zip",
+                width='stretch',
+                on_click="ignore"
+            )
+
+        st.divider()
+        st.subheader("Individual Page Downloads")
+
+        # The grid only ever shows thumbnails; full-resolution bytes are
+        # read from the archive when a page is enlarged or downloaded.
+        # With ZIP_STORED entries that read is just a slice of the archive.
+        with zip_lock:
+            archive = zipfile.ZipFile(zip_file)
+
+        def read_entry(entry_name):
+            with zip_lock:
+                return archive.read(entry_name)
+
+        cols = st.columns(3)
+        for i, entry_name in enumerate(page_names):
+            ext = entry_name.rsplit(".", 1)[1]
+            page_name = f"{pdf_filename}_page_{i + 1:03d}.{ext}"
+
+            with cols[i % 3]:
+                st.image(thumbs[i], caption=f"Page {i + 1}", width='stretch')
+                btn_col1, btn_col2 = st.columns(2)
+
+                with btn_col1:
+                    if st.button("Enlarge 🔎", key=f"enlarge_{i}", use_container_width=True):
+                        show_image_dialog(read_entry(entry_name), i + 1)
+
+                with btn_col2:
+                    st.download_button(
+                        label="Download ⬇️",
+                        data=read_entry(entry_name),
+                        file_name=page_name,
+                        mime=MIME_TYPES.get(ext, "application/octet-stream"),
+                        use_container_width=True,
+                        key=f"download_{i}",
+                        on_click="ignore"
+                    )
+                st.markdown("---")
+else:
+    if "last_file_id" in st.session_state:
+        st.session_state.clear()
+    st.info("Please upload a PDF file using the sidebar on the left to begin.")